@@ -0,0 +1,356 @@
+import os
+import json
+import fcntl
+import threading
+from typing import List, Optional
+
+import numpy as np
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from db.models_db import SessionLocal, BRDUpload
+
+router = APIRouter()
+
+VECTOR_DB_PATH = os.getenv("VECTOR_DB_PATH", "vectordb")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_QUANTIZE = os.getenv("EMBEDDING_QUANTIZE", "").lower() == "int8"
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+SEARCH_BLOCK_ROWS = 16384
+
+os.makedirs(VECTOR_DB_PATH, exist_ok=True)
+
+META_PATH = os.path.join(VECTOR_DB_PATH, "meta.json")
+DATA_PATH = os.path.join(VECTOR_DB_PATH, "embeddings.bin")
+LOCK_PATH = os.path.join(VECTOR_DB_PATH, "embeddings.lock")
+
+# === Embedding model (loaded lazily, once per worker) ===
+_model = None
+_model_lock = threading.Lock()
+
+def _get_model():
+    global _model
+    with _model_lock:
+        if _model is None:
+            from sentence_transformers import SentenceTransformer
+            _model = SentenceTransformer(EMBEDDING_MODEL)
+        return _model
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """Embed texts in batches; rows come back L2-normalized float32."""
+    vectors = _get_model().encode(
+        texts,
+        batch_size=EMBEDDING_BATCH_SIZE,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+    )
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+# === Chunking ===
+def chunk_text(text: str) -> List[tuple]:
+    """Split text into overlapping (start, end) character spans."""
+    spans = []
+    step = CHUNK_SIZE - CHUNK_OVERLAP
+    for start in range(0, len(text), step):
+        end = min(start + CHUNK_SIZE, len(text))
+        if text[start:end].strip():
+            spans.append((start, end))
+        if end == len(text):
+            break
+    return spans
+
+# === On-disk layout ===
+# embeddings.bin is a flat array of fixed-size records:
+#   file_id int64 | start int64 | end int64 | scale float32 | pad | vec[dim]
+# so one mmap covers both the vectors and the chunk metadata, appends are a
+# single write and compaction is a single atomic rename.
+def _record_dtype(dim: int, quantized: bool) -> np.dtype:
+    return np.dtype([
+        ("file_id", "<i8"),
+        ("start", "<i8"),
+        ("end", "<i8"),
+        ("scale", "<f4"),
+        ("_pad", "<f4"),
+        ("vec", "<i1" if quantized else "<f4", (dim,)),
+    ])
+
+def _quantize(vectors: np.ndarray):
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+class EmbeddingStore:
+    """Mmap-backed vector store shared by every uvicorn worker.
+
+    Uploads append records and deletes compact the file into a fresh copy
+    that is swapped in with an atomic rename. Writers serialize on an flock;
+    readers never lock and simply remap when the file's inode or size
+    changes, so all workers search the same page-cached copy and nothing is
+    re-embedded at startup.
+
+    The store is tied to the model it was built with. If EMBEDDING_MODEL
+    changes, search returns nothing and appends fail until the store is
+    rebuilt: delete VECTOR_DB_PATH, restart the workers and call
+    POST /embeddings/backfill.
+    """
+
+    def __init__(
+        self,
+        data_path: str = DATA_PATH,
+        meta_path: str = META_PATH,
+        lock_path: str = LOCK_PATH,
+        model: str = EMBEDDING_MODEL,
+        quantize: bool = EMBEDDING_QUANTIZE,
+    ):
+        self.data_path = data_path
+        self.meta_path = meta_path
+        self.lock_path = lock_path
+        self.model = model
+        self.quantize = quantize
+        self._map = None
+        self._map_key = None
+        self._map_lock = threading.Lock()
+        self._meta = None
+        self._dtype = None
+
+    # --- metadata ---
+    def _load_dtype(self) -> Optional[np.dtype]:
+        if self._dtype is not None:
+            return self._dtype
+        if not os.path.exists(self.meta_path):
+            return None
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self._meta = meta
+        self._dtype = _record_dtype(meta["dim"], meta["quantized"])
+        return self._dtype
+
+    def _create_meta(self, dim: int) -> np.dtype:
+        """Write meta.json for a new store. Caller must hold the write lock."""
+        dtype = self._load_dtype()
+        if dtype is not None:
+            return dtype
+        meta = {"model": self.model, "dim": dim, "quantized": self.quantize}
+        tmp_path = f"{self.meta_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.meta_path)
+        return self._load_dtype()
+
+    def model_matches(self) -> bool:
+        """False when the store on disk was built with a different model."""
+        if self._load_dtype() is None:
+            return True
+        return self._meta["model"] == self.model
+
+    def _write_lock(self):
+        lock_file = open(self.lock_path, "a")
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    # --- mapping ---
+    def _mapped(self) -> Optional[np.ndarray]:
+        """Return the current mmap view, remapping if another worker changed the file."""
+        dtype = self._load_dtype()
+        if dtype is None:
+            return None
+        try:
+            st = os.stat(self.data_path)
+        except FileNotFoundError:
+            return None
+        rows = st.st_size // dtype.itemsize
+        key = (st.st_ino, rows)
+        with self._map_lock:
+            if key != self._map_key:
+                self._map = (
+                    np.memmap(self.data_path, dtype=dtype, mode="r", shape=(rows,))
+                    if rows else None
+                )
+                self._map_key = key
+            return self._map
+
+    # --- writes ---
+    def add_document(self, file_id: int, text: str) -> int:
+        """Chunk, batch-embed and append a document's vectors.
+
+        Returns the chunk count appended, or 0 if the id is already stored.
+        """
+        spans = chunk_text(text)
+        if not spans:
+            return 0
+        if not self.model_matches():
+            raise RuntimeError(
+                f"Embedding store was built with '{self._meta['model']}', not '{self.model}'; "
+                "delete VECTOR_DB_PATH, restart and run the backfill to rebuild it"
+            )
+        vectors = embed_texts([text[s:e] for s, e in spans])
+
+        lock_file = self._write_lock()
+        try:
+            dtype = self._create_meta(vectors.shape[1])
+            if dtype["vec"].shape[0] != vectors.shape[1]:
+                raise RuntimeError("Embedding dimension does not match the existing store")
+
+            # Another upload or backfill may have embedded this id meanwhile.
+            data = self._mapped()
+            if data is not None and (data["file_id"] == file_id).any():
+                return 0
+
+            records = np.zeros(len(spans), dtype=dtype)
+            records["file_id"] = file_id
+            records["start"] = [s for s, _ in spans]
+            records["end"] = [e for _, e in spans]
+            if dtype["vec"].base == np.int8:
+                records["vec"], records["scale"] = _quantize(vectors)
+            else:
+                records["vec"] = vectors
+                records["scale"] = 1.0
+
+            with open(self.data_path, "ab") as f:
+                # Drop any torn tail left by a crashed writer so rows stay aligned.
+                f.truncate(f.tell() - f.tell() % dtype.itemsize)
+                f.seek(0, os.SEEK_END)
+                f.write(records.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        finally:
+            lock_file.close()
+        return len(spans)
+
+    def remove_document(self, file_id: int) -> int:
+        """Compact the store without the given document's rows. Returns rows removed."""
+        lock_file = self._write_lock()
+        try:
+            data = self._mapped()
+            if data is None:
+                return 0
+            keep = data["file_id"] != file_id
+            removed = int(len(data) - keep.sum())
+            if not removed:
+                return 0
+            tmp_path = self.data_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                for begin in range(0, len(data), SEARCH_BLOCK_ROWS):
+                    block = data[begin:begin + SEARCH_BLOCK_ROWS]
+                    f.write(block[keep[begin:begin + SEARCH_BLOCK_ROWS]].tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            # Readers still holding the old mapping keep a valid (unlinked) inode.
+            os.replace(tmp_path, self.data_path)
+            return removed
+        finally:
+            lock_file.close()
+
+    # --- reads ---
+    def document_ids(self) -> set:
+        """Ids of every document that has at least one vector in the store."""
+        data = self._mapped()
+        if data is None:
+            return set()
+        return {int(i) for i in np.unique(data["file_id"])}
+
+    def search(self, query: str, top_k: int = 5, file_id: Optional[int] = None) -> List[dict]:
+        """Cosine top-k over the mapped array, scanned in blocks to bound memory."""
+        data = self._mapped()
+        if data is None or top_k <= 0 or not self.model_matches():
+            return []
+        q = embed_texts([query])[0]
+        quantized = data.dtype["vec"].base == np.int8
+
+        scores = np.empty(len(data), dtype=np.float32)
+        for begin in range(0, len(data), SEARCH_BLOCK_ROWS):
+            block = data[begin:begin + SEARCH_BLOCK_ROWS]
+            vecs = block["vec"]
+            if quantized:
+                block_scores = (vecs.astype(np.float32) @ q) * block["scale"]
+            else:
+                block_scores = vecs @ q
+            if file_id is not None:
+                block_scores = np.where(block["file_id"] == file_id, block_scores, -np.inf)
+            scores[begin:begin + len(block)] = block_scores
+
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {
+                "file_id": int(data["file_id"][i]),
+                "start": int(data["start"][i]),
+                "end": int(data["end"][i]),
+                "score": float(scores[i]),
+            }
+            for i in top
+            if np.isfinite(scores[i])
+        ]
+
+store = EmbeddingStore()
+
+# === Backfill ===
+def backfill(session: Session) -> List[int]:
+    """Embed every BRDUpload missing from the store and drop vectors of
+    deleted uploads. Safe to run repeatedly."""
+    embedded = store.document_ids()
+    existing = {row.id for row in session.query(BRDUpload.id)}
+    for orphan_id in embedded - existing:
+        store.remove_document(orphan_id)
+    added = []
+    for upload in session.query(BRDUpload).filter(~BRDUpload.id.in_(embedded)):
+        if store.add_document(upload.id, upload.full_content or ""):
+            added.append(upload.id)
+    return added
+
+# === Search endpoint ===
+class SearchRequest(BaseModel):
+    query: str
+    top_k: int = 5
+    file_id: Optional[int] = None
+
+@router.post("/search")
+def semantic_search(req: SearchRequest):
+    session: Session = SessionLocal()
+
+    try:
+        hits = store.search(req.query, req.top_k, req.file_id)
+        files = {
+            f.id: f
+            for f in session.query(BRDUpload).filter(
+                BRDUpload.id.in_({hit["file_id"] for hit in hits})
+            )
+        }
+        return [
+            {
+                "file_id": hit["file_id"],
+                "filename": files[hit["file_id"]].filename,
+                "score": hit["score"],
+                "text": files[hit["file_id"]].full_content[hit["start"]:hit["end"]],
+            }
+            for hit in hits
+            if hit["file_id"] in files
+        ]
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    finally:
+        session.close()
+
+@router.post("/embeddings/backfill")
+def backfill_embeddings():
+    session: Session = SessionLocal()
+
+    try:
+        added = backfill(session)
+        return {"success": True, "embedded_file_ids": added}
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    finally:
+        session.close()
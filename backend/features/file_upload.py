@@ -1,14 +1,18 @@
 import os
+import logging
 from fastapi import APIRouter, UploadFile, File, HTTPException
 from fastapi import Path as FastPath
+from fastapi.concurrency import run_in_threadpool
 from pathlib import Path
 from sqlalchemy.orm import Session
 from db.models_db import SessionLocal, BRDUpload
+from features.embedding_store import store
 
 import fitz  # PyMuPDF for PDF
 import docx  # python-docx for Word
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
@@ -73,11 +77,21 @@ async def upload_file(file: UploadFile = File(...)):
         extracted_text = extract_text_from_file(file_path)
         db_id = save_to_db(file.filename, file.content_type, extracted_text)
 
+        # Embed chunks off the event loop; a failure leaves the upload for
+        # POST /embeddings/backfill instead of failing the request
+        embedded = True
+        try:
+            await run_in_threadpool(store.add_document, db_id, extracted_text)
+        except Exception:
+            embedded = False
+            logger.exception("Embedding failed for upload %s", db_id)
+
         return {
             "success": True,
             "file_id": db_id,
             "filename": file.filename,
-            "preview": extracted_text[:300]
+            "preview": extracted_text[:300],
+            "embedded": embedded
         }
 
     except Exception as e:
@@ -93,18 +107,26 @@ def delete_uploaded_file(file_id: int = FastPath(..., description="ID of the fil
         if not file:
             raise HTTPException(status_code=404, detail="File not found")
 
-        # Delete physical file
-        file_path = os.path.join(UPLOAD_DIR, file.filename)
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        filename, record_id = file.filename, file.id
+
+        # Drop its vectors before the row goes: SQLite reuses the newest id,
+        # so vectors outliving the row would be credited to the next upload.
+        # If this fails nothing is deleted; if the commit below fails the row
+        # merely lacks vectors, which POST /embeddings/backfill repairs.
+        store.remove_document(record_id)
 
         # Delete DB record
         session.delete(file)
         session.commit()
 
+        # Delete physical file
+        file_path = os.path.join(UPLOAD_DIR, filename)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
         return {
             "success": True,
-            "message": f"File '{file.filename}' (ID: {file.id}) deleted successfully."
+            "message": f"File '{filename}' (ID: {record_id}) deleted successfully."
         }
 
     except Exception as e:
@@ -10,6 +10,7 @@ from models import MODELS
 from db.models_db import init_db,SessionLocal, BRDUpload
 from sqlalchemy.orm import Session
 from features import chat_with_upload
+from features import embedding_store
 
 
 init_db()
@@ -100,6 +101,9 @@ app.include_router(file_upload.router)
 #chat_with_file_upload
 app.include_router(chat_with_upload.router)
 
+#semantic search over embedded uploads
+app.include_router(embedding_store.router)
+
 @app.get("/")
 def health_check():
     return {"message": "LLM backend is running 🚀"}
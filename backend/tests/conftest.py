@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# Run the backend modules the way uvicorn does: with backend/ on the path.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("VECTOR_DB_PATH", tempfile.mkdtemp(prefix="vectordb-"))
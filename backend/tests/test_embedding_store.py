@@ -0,0 +1,148 @@
+import zlib
+
+import numpy as np
+import pytest
+
+from features import embedding_store
+from features.embedding_store import EmbeddingStore
+
+DIM = 16
+DOCS = {
+    1: "Login must support SSO via the corporate identity provider.",
+    2: "Invoices are exported nightly as CSV to the finance share.",
+    3: "The dashboard shows open tickets grouped by priority.",
+}
+
+
+def fake_embed(texts):
+    """Deterministic unit vectors keyed on the text, in place of the model."""
+    rows = []
+    for text in texts:
+        rng = np.random.default_rng(zlib.crc32(text.encode()))
+        vec = rng.standard_normal(DIM).astype(np.float32)
+        rows.append(vec / np.linalg.norm(vec))
+    return np.stack(rows)
+
+
+@pytest.fixture(autouse=True)
+def stub_model(monkeypatch):
+    monkeypatch.setattr(embedding_store, "embed_texts", fake_embed)
+
+
+def make_store(tmp_path, quantize=False, model="test-model"):
+    return EmbeddingStore(
+        data_path=str(tmp_path / "embeddings.bin"),
+        meta_path=str(tmp_path / "meta.json"),
+        lock_path=str(tmp_path / "embeddings.lock"),
+        model=model,
+        quantize=quantize,
+    )
+
+
+@pytest.mark.parametrize("quantize", [False, True])
+def test_round_trip(tmp_path, quantize):
+    store = make_store(tmp_path, quantize)
+    for file_id, text in DOCS.items():
+        assert store.add_document(file_id, text) == 1
+    assert store.document_ids() == {1, 2, 3}
+
+    hits = store.search(DOCS[2], top_k=3)
+    assert hits[0]["file_id"] == 2
+    assert hits[0]["score"] == pytest.approx(1.0, abs=0.02)
+    assert (hits[0]["start"], hits[0]["end"]) == (0, len(DOCS[2]))
+    assert [h["score"] for h in hits] == sorted((h["score"] for h in hits), reverse=True)
+
+    filtered = store.search(DOCS[2], top_k=3, file_id=3)
+    assert [h["file_id"] for h in filtered] == [3]
+
+    assert store.remove_document(2) == 1
+    assert store.remove_document(2) == 0
+    assert store.document_ids() == {1, 3}
+    assert 2 not in {h["file_id"] for h in store.search(DOCS[2], top_k=3)}
+
+    store.add_document(2, DOCS[2])
+    assert store.search(DOCS[2], top_k=1)[0]["file_id"] == 2
+
+
+def test_reopen_without_reembedding(tmp_path, monkeypatch):
+    make_store(tmp_path, quantize=True).add_document(1, DOCS[1])
+
+    calls = []
+    monkeypatch.setattr(embedding_store, "embed_texts", lambda t: calls.append(t) or fake_embed(t))
+    reopened = make_store(tmp_path)
+    assert reopened.document_ids() == {1}
+    assert calls == []
+    # The quantization setting sticks with the store on disk.
+    assert reopened.search(DOCS[1], top_k=1)[0]["file_id"] == 1
+    assert reopened._mapped().dtype["vec"].base == np.int8
+
+
+def test_torn_tail_is_truncated_on_append(tmp_path):
+    store = make_store(tmp_path)
+    store.add_document(1, DOCS[1])
+    with open(store.data_path, "ab") as f:
+        f.write(b"\x00" * 5)
+
+    assert store.document_ids() == {1}
+    store.add_document(2, DOCS[2])
+
+    itemsize = store._mapped().dtype.itemsize
+    assert (tmp_path / "embeddings.bin").stat().st_size == 2 * itemsize
+    assert store.search(DOCS[2], top_k=1)[0]["file_id"] == 2
+    assert store.search(DOCS[1], top_k=1)[0]["file_id"] == 1
+
+
+def test_model_change(tmp_path):
+    make_store(tmp_path, model="old-model").add_document(1, DOCS[1])
+    store = make_store(tmp_path, model="new-model")
+
+    assert not store.model_matches()
+    assert store.search(DOCS[1]) == []
+    with pytest.raises(RuntimeError):
+        store.add_document(2, DOCS[2])
+    assert store.remove_document(1) == 1
+    assert store.document_ids() == set()
+
+
+def test_backfill_is_idempotent(tmp_path, monkeypatch):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from db.models_db import Base, BRDUpload
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    for file_id in (1, 3):
+        session.add(BRDUpload(id=file_id, filename=f"{file_id}.txt", filetype="text/plain",
+                              full_content=DOCS[file_id]))
+    session.commit()
+
+    store = make_store(tmp_path)
+    monkeypatch.setattr(embedding_store, "store", store)
+    store.add_document(2, DOCS[2])  # vectors left behind by a deleted upload
+
+    assert embedding_store.backfill(session) == [1, 3]
+    assert store.document_ids() == {1, 3}
+    assert embedding_store.backfill(session) == []
+    session.close()
+
+
+def test_same_id_is_not_appended_twice(tmp_path):
+    store = make_store(tmp_path)
+    assert store.add_document(1, DOCS[1]) == 1
+    assert store.add_document(1, DOCS[1]) == 0
+
+    hits = store.search(DOCS[1], top_k=3)
+    assert [h["file_id"] for h in hits] == [1]
+
+
+def test_meta_is_created_once_under_lock(tmp_path):
+    first = make_store(tmp_path, model="test-model")
+    second = make_store(tmp_path, model="test-model", quantize=True)
+    first.add_document(1, DOCS[1])
+    second.add_document(2, DOCS[2])
+
+    # The second store adopts the existing layout instead of rewriting it.
+    assert second._mapped().dtype == first._mapped().dtype
+    assert second.document_ids() == {1, 2}
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["embeddings.bin", "embeddings.lock", "meta.json"]